@@ -0,0 +1,410 @@
+#!/usr/bin/python3
+#
+# asyncio flavour of the core operations of git_common_utils, for services driving many repositories from
+# a single event loop: git runs in asyncio subprocesses and the Github API is called through one aiohttp
+# session sharing a connection pool. Python 3.7+ only. Requires the optional aiohttp package for the API calls
+#
+# Configuration (Github organization, URLs, credentials, clone options...) is shared with git_common_utils
+#
+import sys
+import os.path
+import re
+import json
+import time
+import asyncio
+
+import git_common_utils as utils
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Git processes running at the same time. Each one is a process, so thousands of concurrent operations are queued
+GIT_MAX_CONCURRENT_PROCESSES = 32
+
+# Github API connections shared by all the requests of the event loop
+GITHUB_API_CONNECTION_LIMIT = utils.GITHUB_API_POOL_SIZE
+
+
+#############################################
+#
+#   GIT SUBPROCESSES
+#
+############################################
+
+GIT_SEMAPHORES = {}  # Event loop -> semaphore limiting the git processes started from it
+
+
+def _get_git_semaphore():
+    loop = asyncio.get_event_loop()
+    if loop not in GIT_SEMAPHORES:
+        GIT_SEMAPHORES[loop] = asyncio.Semaphore(GIT_MAX_CONCURRENT_PROCESSES)
+    return GIT_SEMAPHORES[loop]
+
+
+#
+# Runs git with the given arguments and returns its output (stdout and stderr) as text
+# Raises an Exception if git fails. The arguments are not included in the message, as URLs may contain secrets
+#
+async def run_git(arguments, cwd = None, check = True):
+
+    async with _get_git_semaphore():
+        process = await asyncio.create_subprocess_exec("git", *arguments, cwd = cwd, stdout = asyncio.subprocess.PIPE, stderr = asyncio.subprocess.STDOUT)
+        output, _ = await process.communicate()
+
+    output = output.decode("utf-8", "replace")
+    if check and process.returncode != 0:
+        raise Exception("[FATAL] git {0} failed with exit code {1} in {2}: {3}".format(arguments[0], process.returncode, cwd, output.rstrip()))
+    return output
+
+
+#
+# Clone a remote repository
+#
+async def clone_repository(repositoryName, workingDir = "/tmp", cloneOptions = None):
+
+    if repositoryName is None :
+        raise Exception("[FATAL] Please provide a repository name")
+
+    repositoryPath = "{0}/{1}".format(workingDir, repositoryName)
+    if os.path.isdir(repositoryPath):
+        raise Exception("The directory {0}/{1} already exists. Cannot clone {1} at the location specified: {0}.".format(workingDir, repositoryName))
+
+    githubUser, githubToken, githubURL = utils.get_authenticated_repository_url ( repositoryName )
+
+    cloneArguments = cloneOptions.get_clone_arguments().split() if cloneOptions is not None else []
+    await run_git(["clone"] + cloneArguments + [githubURL, repositoryName], cwd = workingDir)
+
+    if cloneOptions is not None and len(cloneOptions.sparsePaths) > 0:
+        await run_git(["sparse-checkout", "init", "--cone"], cwd = repositoryPath)
+        await run_git(["sparse-checkout", "set"] + list(cloneOptions.sparsePaths), cwd = repositoryPath)
+
+    # Shared with the synchronous functions, so they do not validate this workspace again
+    utils.WORKSPACE_REGISTRY.set_origin(repositoryPath, githubURL)
+
+    return repositoryPath
+
+
+#
+# Switch to a workspace and make sure it is a Git repository, optionally cloning it
+# Same as git_common_utils.switch_to_workspace, except that the global git identity is not configured,
+# as none of the asynchronous operations commit
+#
+async def switch_to_workspace(repositoryName, workingDir = "/tmp", cloneRepoIfNotPresent = False, updateOrigin = True, cloneOptions = None):
+
+    errorPrefix = "[FATAL] Cannot switch to workspace: "
+
+    if repositoryName is None :
+        raise Exception("{0} Please provide a repository name".format(errorPrefix))
+
+    if not os.path.isdir(workingDir):
+        raise Exception("{0} The working directory: {1} does not exist or is not readable.".format(errorPrefix, workingDir))
+
+    repositoryPath = "{0}/{1}".format(workingDir, repositoryName)
+    if not os.path.isdir(repositoryPath):
+        if cloneRepoIfNotPresent is not True:
+            raise Exception("{0} {1} does not exist and cloneRepoIfNotPresent was False".format(errorPrefix, repositoryPath))
+        return await clone_repository(repositoryName, workingDir, cloneOptions)
+
+    if not utils.WORKSPACE_REGISTRY.is_valid(repositoryPath):
+        if os.listdir(repositoryPath) == []:
+            raise Exception("{0} {1} is an existing empty directory. Please remove it or chose another path.".format(errorPrefix, repositoryPath))
+        if (await run_git(["rev-parse", "--git-dir"], cwd = repositoryPath, check = False)).startswith("fatal:"):  # Not a Git repo
+            raise Exception("{0} {1} is not a git repository.".format(errorPrefix, repositoryPath))
+        utils.WORKSPACE_REGISTRY.register(repositoryPath)
+
+    if updateOrigin:
+        githubUser, githubToken, githubUrl = utils.get_authenticated_repository_url( repositoryName )
+        if utils.WORKSPACE_REGISTRY.get_origin(repositoryPath) != githubUrl:
+            await run_git(["remote", "set-url", "origin", githubUrl], cwd = repositoryPath)
+            utils.WORKSPACE_REGISTRY.set_origin(repositoryPath, githubUrl)
+
+    return repositoryPath
+
+
+# Fetch changes from a remote. Returns the path of the workspace
+async def fetch(repositoryName, remoteName = "--all", prune = "--prune", tags = "--no-tags", workingDir = "/tmp", cloneRepoIfNotPresent = False):
+
+    if repositoryName is None or remoteName is None:
+        raise Exception("[FATAL] Please provide a repository name and a remote name (or --all)")
+
+    currentDir = await switch_to_workspace(repositoryName, workingDir, cloneRepoIfNotPresent)
+    output = await run_git(["fetch", remoteName, prune, tags], cwd = currentDir)
+    print ("\n[DEBUG] Fetch Results: {0}".format(output.rstrip()), file=sys.stderr)
+
+    return currentDir
+
+
+# Pushes a local branch to the remote branch of the same name, unless another one is given
+async def push(repositoryName, localBranch, remoteName = "origin", remoteBranch = None, workingDir = "/tmp", force = False):
+
+    if repositoryName is None or localBranch is None:
+        raise Exception("[FATAL] Please provide a local branch and a repository name. Optionally include a remote name and remote branch name.")
+
+    if remoteBranch is None:
+        remoteBranch = localBranch
+
+    currentDir = await switch_to_workspace(repositoryName, workingDir)
+    await run_git(["push", remoteName, "{0}:{1}".format(localBranch, remoteBranch)] + (["--force"] if force else []), cwd = currentDir)
+
+
+#
+# Reads all the refs of a workspace in a single git call, optionally fetching first. Returns a RefSnapshot
+# If the repository is not cloned, cloneRepoIfNotPresent is set and allowRemote is set (USE_REMOTE_REFS_WHEN_NOT_CLONED
+# if None), the refs are read from the remote instead of cloning it, like git_common_utils.get_ref_snapshot
+#
+async def get_ref_snapshot(repositoryName, workingDir = "/tmp", cloneRepoIfNotPresent = False, fetchFirst = False, allowRemote = None):
+
+    if repositoryName is None :
+        raise Exception("[FATAL] Please provide a repository name")
+
+    if allowRemote is None:
+        allowRemote = utils.USE_REMOTE_REFS_WHEN_NOT_CLONED
+
+    if allowRemote and cloneRepoIfNotPresent and not os.path.isdir("{0}/{1}".format(workingDir, repositoryName)):
+        githubUser, githubToken, githubURL = utils.get_authenticated_repository_url ( repositoryName )
+        output = await run_git(["ls-remote", "--tags", "--heads", githubURL])
+        return utils.RefSnapshot(utils.parse_ls_remote_output(output))
+
+    currentDir = await switch_to_workspace(repositoryName, workingDir, cloneRepoIfNotPresent)
+    if fetchFirst:
+        await run_git(["fetch"], cwd = currentDir)
+
+    output = await run_git(["for-each-ref", "--format={0}".format(utils.REF_SNAPSHOT_FORMAT)], cwd = currentDir)
+    return utils.RefSnapshot(utils.parse_ref_snapshot_output(output), currentDir)
+
+
+async def get_branches(repositoryName, workingDir = "/tmp", cloneRepoIfNotPresent = False):
+    return (await get_ref_snapshot(repositoryName, workingDir, cloneRepoIfNotPresent, fetchFirst = True)).branches()
+
+
+async def get_tags(repositoryName, workingDir = "/tmp", cloneRepoIfNotPresent = False):
+    return (await get_ref_snapshot(repositoryName, workingDir, cloneRepoIfNotPresent)).tags()
+
+
+async def fetch_latest_tag_for_repo(repositoryName, tagFilter = "", workingDir = "/tmp", cloneRepoIfNotPresent = True):
+    return (await get_ref_snapshot(repositoryName, workingDir, cloneRepoIfNotPresent)).latest_tag(tagFilter)
+
+
+# Runs a single 'git diff --name-status' between the given revisions, or against the working tree if only one is given
+async def diff_name_status(repositoryPath, revisions):
+    return utils.parse_name_status(await run_git(["diff", "--name-status", "-z"] + list(revisions) + ["--"], cwd = repositoryPath))
+
+
+#
+# Diff a tag against a reference tag and find the modified paths, like git_common_utils.diffWithReferenceTag
+#
+async def diffWithReferenceTag(repositoryName, referenceTag, currentTag, workingDir = "/tmp", cloneRepoIfNotPresent = False, startsWith = "", groupPathsByEndingRegex = ""):
+
+    if repositoryName is None:
+        raise Exception("[FATAL] Please provide a repository name")
+
+    if referenceTag is None:
+        raise Exception("[FATAL] Please provide a reference release name")
+
+    if currentTag is None:
+        raise Exception("[FATAL] Please provide a the current release")
+
+    currentDir = await switch_to_workspace(repositoryName, workingDir, cloneRepoIfNotPresent)
+
+    # Get all branches and tags so we can compare tags locally
+    await run_git(["fetch"], cwd = currentDir)
+
+    # Files renamed but 100% identical to their original won't be considered as changes from the reference tag
+    # Also removes projects which only have deleted files
+    entries = await diff_name_status(currentDir, [referenceTag, currentTag])
+    return utils.filter_changed_paths(entries, excludeDeleted = True, startsWith = startsWith, groupPathsByEndingRegex = groupPathsByEndingRegex)
+
+
+#############################################
+#
+#   GITHUB API
+#
+############################################
+
+class GithubApiError(Exception):
+
+    def __init__(self, status, text):
+        Exception.__init__(self, "[FATAL] Github API request failed with status {0}: {1}".format(status, text))
+        self.status = status
+        self.text = text
+
+
+#
+# Github API client over one aiohttp session. All the requests share its connection pool (GITHUB_API_CONNECTION_LIMIT)
+# Server errors are retried with exponential backoff, and rate limited requests (403/429) wait until the reset.
+# Concurrent and mutating requests are limited like the synchronous GithubRateLimiter does
+# Create it inside the event loop, and close it (or use it as an async context manager) when done
+#
+class AsyncGithubClient(object):
+
+    def __init__(self, connectionLimit = GITHUB_API_CONNECTION_LIMIT, maxRetries = utils.GITHUB_API_MAX_RETRIES, backoffFactor = utils.GITHUB_API_BACKOFF_FACTOR,
+                 timeout = utils.GITHUB_API_TIMEOUT_SECONDS, maxConcurrentRequests = utils.GITHUB_API_MAX_CONCURRENT_REQUESTS,
+                 mutationIntervalSeconds = utils.GITHUB_API_MUTATION_INTERVAL_SECONDS):
+        if aiohttp is None:
+            raise Exception("[FATAL] The asynchronous Github API functions need the aiohttp package")
+
+        githubUser, githubToken = utils.get_github_credentials()
+        self.session = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = connectionLimit),
+                                             auth = aiohttp.BasicAuth(githubUser, githubToken),
+                                             timeout = aiohttp.ClientTimeout(total = timeout),
+                                             headers = {"Accept": "application/vnd.github.v3+json"})
+        self.maxRetries = maxRetries
+        self.backoffFactor = backoffFactor
+        self.requestSemaphore = asyncio.Semaphore(maxConcurrentRequests)
+        self.mutationLock = asyncio.Lock()
+        self.mutationIntervalSeconds = mutationIntervalSeconds
+        self.lastMutationTime = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+
+    # Seconds to wait before retrying a response, or None if it must not be retried
+    def _retry_delay(self, status, headers, attempt):
+        if status in (403, 429) and (headers.get("Retry-After") is not None or headers.get("X-RateLimit-Remaining") == "0"):
+            retryAfter = utils.parse_retry_after(headers["Retry-After"]) if headers.get("Retry-After") is not None else None
+            if retryAfter is not None:
+                return retryAfter
+            if headers.get("X-RateLimit-Remaining") == "0":
+                return max(0, int(headers.get("X-RateLimit-Reset", time.time())) - time.time()) + 1
+            return utils.GITHUB_API_SECONDARY_LIMIT_BACKOFF_SECONDS * (2 ** attempt)
+        if status in (500, 502, 503, 504):
+            return self.backoffFactor * (2 ** attempt)
+        return None
+
+    #
+    # Sends a request and returns (status, headers, links, parsed JSON body or None)
+    # Raises a GithubApiError for error responses that are not retried, or once the retries are exhausted
+    #
+    async def request(self, method, url, allowedStatus = (), **kwargs):
+        attempt = 0
+        while True:
+            async with self.requestSemaphore:
+                if method not in ("GET", "HEAD"):
+                    async with self.mutationLock:  # Github asks for some time between mutating requests
+                        await asyncio.sleep(max(0, self.lastMutationTime + self.mutationIntervalSeconds - time.time()))
+                        self.lastMutationTime = time.time()
+                async with self.session.request(method, url, **kwargs) as response:
+                    status = response.status
+                    headers = response.headers
+                    links = {rel: str(link["url"]) for rel, link in response.links.items()}
+                    text = await response.text()
+
+            if status < 400 or status in allowedStatus:
+                return status, headers, links, json.loads(text) if text != "" else None
+
+            delay = self._retry_delay(status, headers, attempt)
+            if delay is None or attempt >= self.maxRetries:
+                raise GithubApiError(status, text)
+            print ("[WARNING] Github API {0} {1} returned {2}, retrying in {3:.1f}s".format(method, url, status, delay), file=sys.stderr)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request("PUT", url, **kwargs)
+
+
+#
+# Returns the items of a paginated Github API listing, in order
+# The first page tells which is the last one (Link rel="last"), so the remaining pages are fetched concurrently
+#
+async def get_github_pages(client, url):
+
+    status, headers, links, items = await client.get(url)
+
+    if "last" not in links or re.search("[?&]page=[0-9]+", links["last"]) is None:
+        # No page numbers to compute, so the listing can only be walked serially
+        while "next" in links:
+            status, headers, links, pageItems = await client.get(links["next"])
+            items.extend(pageItems)
+        return items
+
+    lastPage = int(re.search("[?&]page=([0-9]+)", links["last"]).group(1))
+    pageUrls = [re.sub("([?&]page=)[0-9]+", "\\g<1>{0}".format(page), links["last"]) for page in range(2, lastPage + 1)]
+    for pageResponse in await asyncio.gather(*[client.get(pageUrl) for pageUrl in pageUrls]):
+        items.extend(pageResponse[3])
+    return items
+
+
+#
+# Lists all private repositories the github_ro_user has access to but filtered by its affiliation (Collaborator, organization_member, Owner)
+# https://developer.github.com/v4/enum/repositoryaffiliation/
+#
+async def list_all_repos(client, visibility = "private", affiliation = "collaborator", per_page = "100"):
+
+    url = utils.GITHUB_API_URL+"/user/repos?visibility="+visibility+"&affiliation="+affiliation+"&per_page="+per_page
+    return [r["name"] for r in await get_github_pages(client, url)]
+
+
+async def list_all_filtered_repos(client, visibility = "private", affiliation = "collaborator"):
+
+    return [repoName for repoName in await list_all_repos(client, visibility, affiliation) if re.search(utils.REPO_FILTER, repoName)]
+
+
+#
+# https://developer.github.com/v3/repos/collaborators/#review-a-users-permission-level
+# Possible values for the permission key: admin, write, read, none.
+#
+async def get_user_permission_on_repo(client, repositoryName, userAccount = ""):
+
+    if userAccount == "":
+        userAccount = utils.fetch_github_ro_user()
+
+    url = "{2}/{0}/collaborators/{1}/permission".format(repositoryName, userAccount, utils.GITHUB_REPOS_URL)
+    status, headers, links, body = await client.get(url)
+    return body["permission"]
+
+
+async def check_user_is_a_collaborator(client, repositoryName, userAccount = ""):
+
+    if userAccount == "":
+        userAccount = utils.fetch_github_ro_user()
+
+    url = "{2}/{0}/collaborators/{1}".format(repositoryName, userAccount, utils.GITHUB_REPOS_URL)
+    status, headers, links, body = await client.get(url, allowedStatus = (404,))
+    return status == 204
+
+
+#
+# Creates a Pull Request on the branchName of the repositoryName, like git_common_utils.create_pull_request
+# Returns the number of the Pull Request, or True if there are no commits between the branches
+#
+async def create_pull_request(client, repositoryName, branchName, baseBranch = "master", title = None, body = None):
+
+    dateString = time.strftime('%Y%m%d%H%M%S')
+    data = {"title": title if title is not None else utils.DEFAULT_PULL_REQUEST_TITLE.format(dateString),
+            "body": body if body is not None else utils.DEFAULT_PULL_REQUEST_BODY.format(dateString, utils.DEFAULT_JENKINS_JOB_URL),
+            "head": branchName,
+            "base": baseBranch}
+
+    url = "{0}/{1}/pulls".format(utils.GITHUB_REPOS_URL, repositoryName)
+    try:
+        status, headers, links, pullRequest = await client.post(url, json = data)
+    except GithubApiError as e:
+        if re.search("No commits between", e.text):
+            print ("[WARNING] No Commits found between the base branch '{0}' and the '{1}' branch".format(baseBranch, branchName), file=sys.stdout)
+            return True  # Nothing else to do
+        raise
+
+    print ("\n[INFO] Pull Request #{0} has been created successfully on {1}\n".format(pullRequest["number"], repositoryName), file=sys.stdout)
+    return pullRequest["number"]
+
+
+async def request_reviewers(client, repositoryName, pullRequestNumber, reviewers = utils.DEFAULT_USER_REVIEWERS, team_reviewers = utils.DEFAULT_TEAM_REVIEWERS):
+
+    url = "{2}/{0}/pulls/{1}/requested_reviewers".format(repositoryName, pullRequestNumber, utils.GITHUB_REPOS_URL)
+    await client.post(url, json = {"team_reviewers": team_reviewers, "reviewers": reviewers})
+    print ("\n[INFO] Review requests have been raised successfully for Pull Request #{0}".format(pullRequestNumber), file=sys.stdout)
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+import os,sys,inspect
+import re
+import json
+import argparse
+
+
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0,parentdir)
+import git_common_utils as utils
+
+
+# Operations that can be run from the command line, and whether they can clone the repositories
+OPERATIONS = {"fetch_all": (utils.fetch_all, True),
+              "create_branch_on_repo": (utils.create_branch_on_repo, True),
+              "pull_changes_from_origin_master": (utils.pull_changes_from_origin_master, True),
+              "add_commit_and_push": (utils.add_commit_and_push, False),
+              "fetch_latest_tag_for_repo": (utils.fetch_latest_tag_for_repo, True)}
+
+
+############################################################
+#
+#   MAIN
+#
+############################################################
+
+# [START run]
+def main(repositoriesArgumentList, operationName, operationArguments, workers, useProcesses, timeoutSeconds, workingDir, reportFilename):
+
+    if "all" in repositoriesArgumentList:
+        repoList = utils.list_all_filtered_repos(affiliation = "organization_member")
+    else:
+        repoList = [repo for repo in repositoriesArgumentList if re.search(utils.REPO_FILTER, repo)]
+
+    if len(repoList) == 0:
+        print "\n\n[INFO] Nothing to to. Please provide one or more valid repositories.\n\n"
+        sys.exit(2)
+
+    operation, canClone = OPERATIONS[operationName]
+    kwargs = {"cloneRepoIfNotPresent": True} if canClone else {}
+
+    bulkResult = utils.run_bulk_operation(repoList, operation, operationArguments, kwargs, workers, useProcesses, timeoutSeconds, workingDir)
+
+    for repoName in bulkResult.failed() + bulkResult.timed_out():
+        print "[ERROR] {0}: {1}".format(repoName, bulkResult.results[repoName]["error"])
+
+    if reportFilename is not None:
+        with open(reportFilename, 'w') as f:
+            json.dump([bulkResult.results[repoName] for repoName in sorted(bulkResult.results)], f, indent=2, default=str)
+        print "[INFO] Report written to {0}".format(reportFilename)
+
+    if len(bulkResult.succeeded()) != len(repoList):
+        sys.exit(3)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser( description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-r','--repositories', required=True, metavar='repositories', nargs='+', help='List of one or more Github repositories to perform the operation on.\nUse -r all to run it on all filtered repositories.')
+    parser.add_argument('-o','--operation', required=True, metavar='operation', choices=sorted(OPERATIONS.keys()), help='Operation to run on every repository: {0}'.format(", ".join(sorted(OPERATIONS.keys()))))
+    parser.add_argument('-a','--arguments', metavar='arguments', nargs='*', default=[], help='Arguments of the operation after the repository name, e.g. the branch name of create_branch_on_repo.')
+    parser.add_argument('-w','--workers', metavar='workers', type=int, default=utils.DEFAULT_BULK_WORKERS, help='Number of repositories processed concurrently. Defaults to {0}'.format(utils.DEFAULT_BULK_WORKERS))
+    parser.add_argument('-p','--processes', action='store_true', help='Run every operation in its own process instead of a thread, so timed out operations can be killed.')
+    parser.add_argument('-t','--timeout', metavar='timeout', type=int, default=utils.DEFAULT_BULK_TIMEOUT_SECONDS, help='Seconds allowed for each repository. Defaults to {0}'.format(utils.DEFAULT_BULK_TIMEOUT_SECONDS))
+    parser.add_argument('-d','--working-dir', metavar='workingDir', help='Directory where every repository gets its own working directory. Defaults to a new temporary directory.')
+    parser.add_argument('--report', metavar='report', help='Optional JSON file where the result of every repository is written.')
+    args = parser.parse_args()
+    main(args.repositories, args.operation, args.arguments, args.workers, args.processes, args.timeout, args.working_dir, args.report)
+# [END run]
@@ -8,22 +8,36 @@ import git_common_utils as utils
 
 
 def usage():
-  print ('[INFO] Usage: '+sys.argv[0]+' <repositoryName> <branch> [optionalUserReviewer-1..optionalUserReviewer-N]')
+  print ('[INFO] Usage: '+sys.argv[0]+' <repositoryName>[,<repositoryName2>..,<repositoryNameN>] <branch> [optionalUserReviewer-1..optionalUserReviewer-N]')
+  print ('[INFO] - With several comma separated repositories, the Pull Requests are opened concurrently and the branches which already have one open are skipped.')
   sys.exit(1)
 
 if len(sys.argv)<3:
   usage()
 
-REPO_NAME = sys.argv[1]
+REPO_NAMES = sys.argv[1].split(",")
 FEATURE_BRANCH = sys.argv[2]
 
 # Check if an overriding list of User reviewers has been specified as a script argument
-
-# The function provides defaults for PR Title, PR Body and List of Team Reviewers
-pullRequestNumber = utils.create_pull_request(REPO_NAME, FEATURE_BRANCH)
-
 REVIEWERS = []
 if len(sys.argv)>3 :
     REVIEWERS = sys.argv[3:len(sys.argv)]
 
-utils.request_reviewers(REPO_NAME, pullRequestNumber, reviewers=REVIEWERS)
+if len(REPO_NAMES) == 1:
+    # The function provides defaults for PR Title, PR Body and List of Team Reviewers
+    pullRequestNumber = utils.create_pull_request(REPO_NAMES[0], FEATURE_BRANCH)
+    utils.request_reviewers(REPO_NAMES[0], pullRequestNumber, reviewers=REVIEWERS)
+else:
+    results = utils.create_pull_requests([(repoName, FEATURE_BRANCH, None, None, None, REVIEWERS) for repoName in REPO_NAMES])
+
+    failedRepos = []
+    for repoName in REPO_NAMES:
+        result = results[(repoName, FEATURE_BRANCH, "master")]
+        if result["status"] == "failed":
+            print ("[ERROR] The Pull Request could not be created on {0}: {1}".format(repoName, result["error"]))
+            failedRepos.append(repoName)
+        else:
+            print ("[INFO] {0}: {1} {2}".format(repoName, result["status"], "#{0}".format(result["number"]) if result["number"] is not None else ""))
+
+    if len(failedRepos) > 0:
+        sys.exit(3)
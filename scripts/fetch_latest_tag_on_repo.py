@@ -15,7 +15,8 @@ def usage():
 if len(sys.argv)<2 :
     usage()
 
-# It is likely that the repository won't exist locally so we default to cloning it as the original function does
+# It is likely that the repository won't exist locally. In that case it is cloned, unless utils.USE_REMOTE_REFS_WHEN_NOT_CLONED
+# is set, then the tags are read from the remote with git ls-remote and the latest tag is the highest version number
 CLONE_REPO=True
 latestTag=""
 REPO_NAME = sys.argv[1]
@@ -3,6 +3,8 @@ import os,sys,inspect
 import re
 import datetime as dt
 import argparse
+import threading
+import Queue
 
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
 parentdir = os.path.dirname(currentdir)
@@ -14,32 +16,207 @@ from subprocess import check_output, PIPE, STDOUT
 # globalVars
 globalVars = {}
 globalVars["BASE_WORKSPACE"] = "/projects/github_repo_backups"
-globalVars["VERSION_REPORT"] = []
 globalVars["VERSION_REPORT_BASE_FILENAME"] = "repositories-version-report"
-globalVars["VERSION_REPORT_FILE_EXTENSION"] = "csv"
+globalVars["VERSION_REPORT_FORMAT"] = "csv"
+globalVars["VERSION_REPORT_WRITER"] = None  # Opened by main. The rows of every repository are written as soon as it is reported
+globalVars["VERSION_REPORT_COLUMNS"] = [("repository", "string"), ("item", "string"), ("version", "string"), ("file", "string")]
 globalVars["RETENTION_DAYS"] = "14"
 
+# Files listing the versions of the repositories a repository depends on, read from its default branch
+globalVars["DEPENDENCY_FILES"] = ["requirements.yml", "roles/requirements.yml"]
 
-def writeReport(date):
-    versionReportFilename = "{0}_{1}.{2}".format(globalVars["VERSION_REPORT_BASE_FILENAME"], date, globalVars["VERSION_REPORT_FILE_EXTENSION"])
+# Backup pipeline: clone workers feed compression workers through a bounded queue
+# At most CLONE_WORKERS + PIPELINE_QUEUE_SIZE + COMPRESSION_WORKERS clones are on disk at any time
+globalVars["CLONE_WORKERS"] = 4
+globalVars["COMPRESSION_WORKERS"] = 2
+globalVars["PIPELINE_QUEUE_SIZE"] = 2
+
+# Archive format of the backups. See utils.write_repository_archive
+globalVars["ARCHIVE_CODEC"] = utils.DEFAULT_ARCHIVE_CODEC
+globalVars["ARCHIVE_LEVEL"] = utils.DEFAULT_ARCHIVE_LEVEL
+
+# Backup mode: "clone" archives a fresh clone of every repository
+# "mirror" refreshes a persistent mirror of every repository and bundles it, optionally incrementally
+globalVars["BACKUP_MODE"] = "clone"
+globalVars["INCREMENTAL"] = False
+globalVars["MIRRORS_DIR"] = "{0}/mirrors".format(globalVars["BASE_WORKSPACE"])
+
+
+def openReport(date):
+    versionReportFilename = utils.get_report_filename(globalVars["VERSION_REPORT_BASE_FILENAME"], date, globalVars["VERSION_REPORT_FORMAT"])
     print "\n\n[INFO] Writing Version Report to file {0}".format(versionReportFilename)
 
-    with open(versionReportFilename, 'w') as f:
-        for line in globalVars["VERSION_REPORT"]:
-            f.write("{0}\n".format(line))
+    globalVars["VERSION_REPORT_WRITER"] = utils.get_report_writer(versionReportFilename, globalVars["VERSION_REPORT_COLUMNS"], globalVars["VERSION_REPORT_FORMAT"])
+
+
+def closeReport():
+    versionReportWriter = globalVars["VERSION_REPORT_WRITER"]
+    versionReportWriter.close()
+    print "\n\n[INFO] Version Report written to file {0} ({1} rows)".format(versionReportWriter.reportPath, versionReportWriter.rowCount)
+
 
+# Writes the rows reported for a repository, once all of them are known, so a failed repository leaves no partial rows
+def writeReportRows(rows):
+    for row in rows:
+        print "[INFO] [VERSION_REPORT] {0}".format("\t".join(["{0}".format(value) for value in row]))
+    if globalVars["VERSION_REPORT_WRITER"] is not None:
+        globalVars["VERSION_REPORT_WRITER"].write_rows(rows)
 
 
-def report_version(repoName, fileName, regularExpression):
-    file = open(fileName, 'r')
-    fileContents = file.read()
-    file.close()
+# Returns the report rows of the versions found in a file. The contents are read from fileName unless given
+def report_version(repoName, fileName, regularExpression, fileContents = None):
+    if fileContents is None:
+        file = open(fileName, 'r')
+        fileContents = file.read()
+        file.close()
+    rows = []
     for match in re.finditer(regularExpression, fileContents):
         itemName = match.group(1)
         itemVersion = match.group(2)
-        versionString = "{0}\t{1}\t{2}\t{3}".format(repoName, itemName, itemVersion, fileName)
-        globalVars["VERSION_REPORT"].append(versionString)
-        print "[INFO] [VERSION_REPORT] {0}".format(versionString)
+        rows.append((repoName, itemName, itemVersion, fileName))
+    return rows
+
+
+# Returns the report rows of the versions of the required repositories, reading the dependency files from the object database
+# so it works the same on clones and on bare mirrors, without a checkout
+def report_dependencies(repoName, repositoryPath):
+
+    # Check which type of repo this is and which file contains the requirement repo tags
+    regEx = "{0}/({1}[-_a-z]+).git(?:\\s+)version(?:\\s*):(?:\\s*)\"(.*)\"".format(utils.GITHUB_ORG, utils.REPO_PREFIX)
+
+    rows = []
+    with utils.GitCatFileSession(repositoryPath) as session:
+        for fileName in globalVars["DEPENDENCY_FILES"]:
+            fileContents = session.read_file("HEAD", fileName)
+            if fileContents is not None:
+                rows.extend(report_version(repoName, fileName, regEx, fileContents))
+    return rows
+
+
+# Clones the repository into the workspace and reports its tags and branches
+def clone_and_report(repoName, currentWorkspace):
+
+    # Clone the repo if it does not exist locally and if it does, make sure it is a valid git repo
+    print "\n\n[INFO] Cloning {0} into {1}".format(repoName, currentWorkspace)
+    # Objects borrowed from the reference repository cache are copied, so the archived clone is self-contained
+    repositoryPath = utils.switch_to_workspace(repoName, cloneRepoIfNotPresent = True, workingDir = currentWorkspace, cloneOptions = utils.CloneOptions(dissociate = True))
+
+    # The clone is fresh, so the refs are read once without fetching again
+    refs = utils.get_ref_snapshot(repoName, cloneRepoIfNotPresent = True, workingDir = currentWorkspace)
+    writeReportRows(report_refs(repoName, refs.tags(), refs.branches()) + report_dependencies(repoName, repositoryPath))
+
+
+# Refreshes the persistent mirror of the repository and reports its tags and branches
+def mirror_and_report(repoName, currentWorkspace):
+
+    print "\n\n[INFO] Updating the mirror of {0} in {1}".format(repoName, globalVars["MIRRORS_DIR"])
+    mirrorPath = utils.update_mirror(repoName, globalVars["MIRRORS_DIR"])
+
+    refs = utils.RefSnapshot.from_repository(mirrorPath)
+    writeReportRows(report_refs(repoName, refs.tags(), refs.local_branches()) + report_dependencies(repoName, mirrorPath))
+
+
+# Returns the report rows of the tags and branches: their number in the version column and their list in the file column
+def report_refs(repoName, tags, branches):
+
+    return [(repoName, "TAGS", len(tags), "{0}".format(tags)),
+            (repoName, "BRANCHES", len(branches), "{0}".format(branches))]
+
+
+# Bundles the mirror of the repository into the workspace, only with the changes since the last run if incremental
+def bundle_mirror(repoName, currentWorkspace, dateString):
+
+    mirrorPath = "{0}/{1}.git".format(globalVars["MIRRORS_DIR"], repoName)
+    if globalVars["INCREMENTAL"]:
+        bundlePath = "{0}/{1}.{2}.incremental.bundle".format(currentWorkspace, repoName, dateString)
+    else:
+        bundlePath = "{0}/{1}.{2}.bundle".format(currentWorkspace, repoName, dateString)
+
+    print "[INFO] Bundling the mirror of {0} into {1}".format(repoName, bundlePath)
+    if utils.create_bundle(mirrorPath, bundlePath, globalVars["INCREMENTAL"]) is not None:
+        utils.append_to_checksum_manifest(bundlePath, utils.compute_file_checksum(bundlePath))
+
+
+# Tars and compresses the cloned repository in a single pass, records its checksum, then removes the clone
+def compress_and_clean(repoName, currentWorkspace, dateString):
+
+    archiveFilename = utils.get_archive_filename(repoName, dateString, globalVars["ARCHIVE_CODEC"])
+    archivePath = "{0}/{1}".format(currentWorkspace, archiveFilename)
+    print "[INFO] Archiving a clone of {0} into {1} ({2}, level {3})".format(repoName, archivePath, globalVars["ARCHIVE_CODEC"], globalVars["ARCHIVE_LEVEL"])
+    checksum = utils.write_repository_archive("{0}/{1}".format(currentWorkspace, repoName), archivePath, globalVars["ARCHIVE_CODEC"], globalVars["ARCHIVE_LEVEL"])
+    utils.append_to_checksum_manifest(archivePath, checksum)
+
+    remove_clone(repoName, currentWorkspace)
+
+
+# Clean Up the workspace and leave only zipped files
+def remove_clone(repoName, currentWorkspace):
+    print "[INFO] Removing the clone directory {0}/{1}".format(currentWorkspace, repoName)
+    output = check_output( ["cd {0}; rm -rf {1}".format(currentWorkspace, repoName)], stderr=STDOUT, shell=True).rstrip()
+
+
+# Removes the clone of a failed repository. Errors are only logged, so the worker keeps running and the pipeline does not hang
+def discard_clone(repoName, currentWorkspace):
+    try:
+        remove_clone(repoName, currentWorkspace)
+    except Exception as e:
+        print "\n[ERROR] The clone of {0} could not be removed: {1}".format(repoName, e)
+
+
+# First stage of the pipeline. Network bound
+def clone_worker(cloneQueue, compressionQueue, currentWorkspace, failedRepos):
+    while True:
+        repoName = cloneQueue.get()
+        if repoName is None:
+            return
+        try:
+            if globalVars["BACKUP_MODE"] == "mirror":
+                mirror_and_report(repoName, currentWorkspace)
+            else:
+                clone_and_report(repoName, currentWorkspace)
+        except Exception as e:
+            print "\n[ERROR] Repository {0} could not be cloned: {1}".format(repoName, e)
+            failedRepos.append(repoName)
+            if globalVars["BACKUP_MODE"] != "mirror":
+                discard_clone(repoName, currentWorkspace)
+            continue
+        # Blocks while the compression stage is behind, so the number of clones on disk stays capped
+        compressionQueue.put(repoName)
+
+
+# Second stage of the pipeline. CPU bound
+def compression_worker(compressionQueue, currentWorkspace, dateString, failedRepos):
+    while True:
+        repoName = compressionQueue.get()
+        if repoName is None:
+            return
+        try:
+            if globalVars["BACKUP_MODE"] == "mirror":
+                bundle_mirror(repoName, currentWorkspace, dateString)
+            else:
+                compress_and_clean(repoName, currentWorkspace, dateString)
+        except Exception as e:
+            print "\n[ERROR] Repository {0} could not be archived: {1}".format(repoName, e)
+            failedRepos.append(repoName)
+            if globalVars["BACKUP_MODE"] != "mirror":
+                discard_clone(repoName, currentWorkspace)
+
+
+def start_workers(numWorkers, target, args):
+    workers = []
+    for i in range(max(1, numWorkers)):
+        worker = threading.Thread(target=target, args=args)
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    return workers
+
+
+def stop_workers(workers, workQueue):
+    for worker in workers:
+        workQueue.put(None)
+    for worker in workers:
+        worker.join()
 
 
 ############################################################
@@ -49,7 +226,7 @@ def report_version(repoName, fileName, regularExpression):
 ############################################################
 
 # [START main]
-def main(repositoriesArgumentList, retentionDaysArgument):
+def main(repositoriesArgumentList, retentionDaysArgument, cloneWorkersArgument, compressionWorkersArgument, queueSizeArgument, codecArgument, levelArgument, modeArgument, incrementalArgument, reportFormatArgument = None):
 
     # RunAs User Check
     runAsUser = check_output( ["id -un"], stderr=STDOUT, shell=True).rstrip()
@@ -78,6 +255,32 @@ def main(repositoriesArgumentList, retentionDaysArgument):
     if retentionDaysArgument != None and int(retentionDaysArgument) > 0:
         globalVars["RETENTION_DAYS"] = int(retentionDaysArgument)
 
+    # Pipeline concurrency
+    if cloneWorkersArgument != None and int(cloneWorkersArgument) > 0:
+        globalVars["CLONE_WORKERS"] = int(cloneWorkersArgument)
+    if compressionWorkersArgument != None and int(compressionWorkersArgument) > 0:
+        globalVars["COMPRESSION_WORKERS"] = int(compressionWorkersArgument)
+    if queueSizeArgument != None and int(queueSizeArgument) > 0:
+        globalVars["PIPELINE_QUEUE_SIZE"] = int(queueSizeArgument)
+
+    # Archive format
+    if codecArgument != None:
+        globalVars["ARCHIVE_CODEC"] = codecArgument
+    if levelArgument != None:
+        globalVars["ARCHIVE_LEVEL"] = int(levelArgument)
+
+    # Backup mode
+    if modeArgument != None:
+        globalVars["BACKUP_MODE"] = modeArgument
+    globalVars["INCREMENTAL"] = incrementalArgument is True
+    if globalVars["INCREMENTAL"] and globalVars["BACKUP_MODE"] != "mirror":
+        print "\n\n[FATAL] Incremental backups are only available in mirror mode.\n\n"
+        sys.exit(1)
+
+    # Version report format
+    if reportFormatArgument != None:
+        globalVars["VERSION_REPORT_FORMAT"] = reportFormatArgument
+
     # Create the workspace wher ethe repositories will be cloned
     dateString = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
     currentWorkspace = "{0}/{1}".format(globalVars["BASE_WORKSPACE"], dateString)
@@ -88,43 +291,37 @@ def main(repositoriesArgumentList, retentionDaysArgument):
     for repo in repoList:
         print "[INFO] {0}".format(repo)
 
+    print "\n[INFO] Backup mode: {0}{1}".format(globalVars["BACKUP_MODE"], " (incremental)" if globalVars["INCREMENTAL"] else "")
+    print "[INFO] Pipeline: {0} clone workers, {1} compression workers, queue size {2}".format(globalVars["CLONE_WORKERS"], globalVars["COMPRESSION_WORKERS"], globalVars["PIPELINE_QUEUE_SIZE"])
 
-    for repoName in repoList:
-
-        # Clone the repo if it does not exist locally and if it does, make sure it is a valid git repo
-        print "\n\n[INFO] Cloning {0} into {1}".format(repoName, currentWorkspace)
-        repositoryPath = utils.switch_to_workspace(repoName, cloneRepoIfNotPresent = True, workingDir = currentWorkspace)
-
-        # Check which type of repo this is and which file contains the requirement repo tags
-        regEx = "{0}/({1}[-_a-z]+).git(?:\\s+)version(?:\\s*):(?:\\s*)\"(.*)\"".format(utils.GITHUB_ORG, utils.REPO_PREFIX)
+    # The Version Report is written as the repositories complete
+    openReport(dateString)
 
-        tags = utils.get_tags(repoName, cloneRepoIfNotPresent = True, workingDir = currentWorkspace)
-        versionString = "{0}\t{1}\t{2}\t{3}".format(repoName, "TAGS", len(tags), "{0}".format(tags))
-        globalVars["VERSION_REPORT"].append(versionString)
-        print "[INFO] [VERSION_REPORT] {0}".format(versionString)
+    failedRepos = []
+    cloneQueue = Queue.Queue()
+    compressionQueue = Queue.Queue(maxsize = globalVars["PIPELINE_QUEUE_SIZE"])
 
-        branches = utils.get_branches(repoName, cloneRepoIfNotPresent = True, workingDir = currentWorkspace)
-        versionString = "{0}\t{1}\t{2}\t{3}".format(repoName, "BRANCHES", len(branches), "{0}".format(branches))
-        globalVars["VERSION_REPORT"].append(versionString)
-        print "[INFO] [VERSION_REPORT] {0}".format(versionString)
+    compressionWorkers = start_workers(globalVars["COMPRESSION_WORKERS"], compression_worker, (compressionQueue, currentWorkspace, dateString, failedRepos))
+    cloneWorkers = start_workers(globalVars["CLONE_WORKERS"], clone_worker, (cloneQueue, compressionQueue, currentWorkspace, failedRepos))
 
-        # Tar and Zip up the cloned repository
-        tarFilename = "{0}.{1}.tar".format(repoName, dateString)
-        print "[INFO] Zipping a clone of {0} into {1}/{2}.gz".format(repoName, currentWorkspace, tarFilename)
-        output = check_output( ["cd {0}; tar cvf {1} {2}".format(currentWorkspace, tarFilename, repoName)], stderr=STDOUT, shell=True).rstrip()
-        output = check_output( ["cd {0}; gzip --best {1}".format(currentWorkspace, tarFilename)], stderr=STDOUT, shell=True).rstrip()
+    for repoName in repoList:
+        cloneQueue.put(repoName)
 
-        # Clean Up the workspace and leave only zipped files
-        print "[INFO] Removing the clone directory {0}/{1}".format(currentWorkspace, repoName)
-        output = check_output( ["cd {0}; rm -rf {1}".format(currentWorkspace, repoName)], stderr=STDOUT, shell=True).rstrip()
+    # Drain the clone stage first, then the compression stage
+    stop_workers(cloneWorkers, cloneQueue)
+    stop_workers(compressionWorkers, compressionQueue)
 
-    # Write the Version Report to a File
-    writeReport(dateString)
+    # Complete the Version Report file
+    closeReport()
 
     # Apply backup retention policy
     print "[INFO] Applying the Backup Retention Policy: Deleting backups older than {0} days.\n".format(globalVars["RETENTION_DAYS"])
     output = check_output( ["cd {0}; find {0} -maxdepth 1 -name \"20*\" -type d -mtime +{1} -exec rm -rf {{}} \\;".format(globalVars["BASE_WORKSPACE"], globalVars["RETENTION_DAYS"])], stderr=STDOUT, shell=True).rstrip()
 
+    if len(failedRepos) > 0:
+        print "\n\n[ERROR] Backup failed for {0} repositories: {1}".format(len(failedRepos), failedRepos)
+        sys.exit(3)
+
     print "[INFO] [SUCCESS] Backup and Reporting Complete on {0} repositories".format(len(repoList))
 
 # [END main]
@@ -136,6 +333,14 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser( description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument('-r','--repositories', required=True, metavar='repositories', nargs='+', help='List of one or more Github repositories to perform the actions on.\nUse -r all to scan all filtered Org repositories.')
     parser.add_argument('-d','--days', metavar='days', help='Optional Backup Retention Policy. Discard backups older than this number of days. Defaults to '+globalVars["RETENTION_DAYS"])
+    parser.add_argument('--clone-workers', metavar='cloneWorkers', help='Number of repositories cloned concurrently. Defaults to {0}'.format(globalVars["CLONE_WORKERS"]))
+    parser.add_argument('--compression-workers', metavar='compressionWorkers', help='Number of clones archived concurrently. Defaults to {0}'.format(globalVars["COMPRESSION_WORKERS"]))
+    parser.add_argument('--queue-size', metavar='queueSize', help='Number of clones waiting to be archived before cloning pauses. Defaults to {0}'.format(globalVars["PIPELINE_QUEUE_SIZE"]))
+    parser.add_argument('--codec', metavar='codec', choices=sorted(utils.ARCHIVE_EXTENSIONS.keys()), help='Archive codec: gzip, xz, zstd (needs the zstandard package) or tar. Defaults to {0}'.format(globalVars["ARCHIVE_CODEC"]))
+    parser.add_argument('--level', metavar='level', help='Compression level of the codec. Defaults to {0}'.format(globalVars["ARCHIVE_LEVEL"]))
+    parser.add_argument('--mode', metavar='mode', choices=['clone', 'mirror'], help='clone: archive a fresh clone of every repository. mirror: refresh a persistent mirror in '+globalVars["MIRRORS_DIR"]+' and save it as a git bundle. Defaults to '+globalVars["BACKUP_MODE"])
+    parser.add_argument('--incremental', action='store_true', help='Mirror mode only. Bundle only the changes since the previous run. Restoring needs every bundle back to the last full one, so keep the retention policy longer than the interval between full backups.')
+    parser.add_argument('--report-format', metavar='reportFormat', choices=sorted(utils.REPORT_WRITERS.keys()), help='Version report format: csv (tab separated), jsonl or parquet (needs the pyarrow package). Defaults to {0}'.format(globalVars["VERSION_REPORT_FORMAT"]))
     args = parser.parse_args()
-    main(args.repositories, args.days)
+    main(args.repositories, args.days, args.clone_workers, args.compression_workers, args.queue_size, args.codec, args.level, args.mode, args.incremental, args.report_format)
 # [END run]
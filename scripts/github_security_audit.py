@@ -1,6 +1,7 @@
 #!/usr/bin/python
 import os,sys,inspect
 import re
+import json
 import datetime as dt
 import argparse
 
@@ -29,7 +30,7 @@ def usage():
 ############################################################
 
 # [START run]
-def main(repositoriesArgumentList):
+def main(repositoriesArgumentList, workers, reportFilename, useGraphql):
 
     # RunAs User Check
     runAsUser = check_output( ["id -un"], stderr=STDOUT, shell=True).rstrip()
@@ -44,26 +45,48 @@ def main(repositoriesArgumentList):
     print "[DEBUG] FILTERED REPO LIST: {0}".format(repoList)
 
     userAccount = utils.fetch_github_ro_user()
-    incorrectRepos = []
-    for repoName in repoList:
+    print "[INFO] Auditing {0} repositories with {1} workers".format(len(repoList), workers)
+    auditResults = utils.audit_repositories_access(repoList, userAccount, workers, useGraphql)
 
-        isCollaborator = utils.check_user_is_a_collaborator(repoName)
-        if isCollaborator:
-            permission = utils.get_user_permission_on_repo(repoName)
-            print "[INFO] User {0} is a collaborator on the repository {1} with permission {2}".format(userAccount, repoName, permission)
+    incorrectRepos = []
+    failedRepos = []
+    for result in auditResults:
+        repoName = result["repository"]
+        if result["error"] is not None:
+            print "[ERROR] The repository {0} could not be audited: {1}".format(repoName, result["error"])
+            failedRepos.append(repoName)
+        elif result["collaborator"]:
+            print "[INFO] User {0} is a collaborator on the repository {1} with permission {2}".format(userAccount, repoName, result["permission"])
         else:
             print "[INFO] User {0} is NOT a collaborator on the repository {1}".format(userAccount, repoName)
             incorrectRepos.append(repoName)
 
-        #if (not isCollaborator or permission != "admin"):
+        #if (not result["collaborator"] or result["permission"] != "admin"):
         #    utils.add_collaborator(repoName, userAccount = "", permission = "owner")
 
     print "\n[INFO] INCORRECT REPOS: {0}".format(incorrectRepos)
+    if len(failedRepos) > 0:
+        print "\n[ERROR] REPOS THAT COULD NOT BE AUDITED: {0}".format(failedRepos)
+
+    print "[INFO] Github API usage: {0}".format(utils.get_github_rate_limit_metrics())
+
+    if reportFilename is not None:
+        report = {"user": userAccount,
+                  "date": dt.datetime.now().strftime("%Y%m%d_%H%M%S"),
+                  "incorrect": incorrectRepos,
+                  "failed": failedRepos,
+                  "repositories": auditResults}
+        with open(reportFilename, 'w') as f:
+            json.dump(report, f, indent=2)
+        print "[INFO] Audit report written to {0}".format(reportFilename)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser( description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument('-r','--repositories', required=True, metavar='repositories', nargs='+', help='List of one or more Github repositories to perform the actions on.\nUse -r all to scan all filtered repositories.')
+    parser.add_argument('-w','--workers', metavar='workers', type=int, default=utils.DEFAULT_AUDIT_WORKERS, help='Number of repositories audited concurrently. Defaults to {0}'.format(utils.DEFAULT_AUDIT_WORKERS))
+    parser.add_argument('-o','--output', metavar='output', help='Optional JSON file where the structured audit report is written.')
+    parser.add_argument('-g','--graphql', action='store_true', help='Retrieve the access on all the Org repositories with a few GraphQL requests. Repositories GraphQL cannot answer are checked with the REST API.')
     args = parser.parse_args()
-    main(args.repositories)
+    main(args.repositories, args.workers, args.output, args.graphql)
 # [END run]
@@ -0,0 +1,68 @@
+#!/usr/bin/python
+import os,sys,inspect,unittest
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+grandparentdir = os.path.dirname(parentdir)
+sys.path.insert(0,grandparentdir)
+
+import git_common_utils as utils
+
+# Offline tests of the monorepo diff parsing: python -m unittest discover -s tests/unit -p "test_*.py"
+
+
+class ParseNameStatusTest(unittest.TestCase):
+
+    def test_modifications_additions_and_deletions(self):
+        output = "M\0svc/a/main.py\0A\0svc/b/new.py\0D\0old.txt\0"
+        self.assertEqual(utils.parse_name_status(output),
+                         [("M", "svc/a/main.py"), ("A", "svc/b/new.py"), ("D", "old.txt")])
+
+    def test_renames_and_copies_keep_the_destination(self):
+        # Renames and copies carry the source and the destination paths
+        output = "R100\0svc/a/x.py\0svc/a/x2.py\0C075\0svc/a/y.py\0svc/b/y.py\0M\0z.txt\0"
+        self.assertEqual(utils.parse_name_status(output),
+                         [("R100", "svc/a/x2.py"), ("C075", "svc/b/y.py"), ("M", "z.txt")])
+
+    def test_paths_with_spaces_and_tabs(self):
+        output = "M\0dir with space/a\tb.txt\0"
+        self.assertEqual(utils.parse_name_status(output), [("M", "dir with space/a\tb.txt")])
+
+    def test_empty_output(self):
+        self.assertEqual(utils.parse_name_status(""), [])
+
+
+class FilterChangedPathsTest(unittest.TestCase):
+
+    ENTRIES = [("M", "svc/a/src/main.py"),
+               ("R100", "svc/a/src/renamed.py"),
+               ("R087", "svc/b/src/edited.py"),
+               ("D", "svc/c/src/gone.py"),
+               ("A", "docs/readme.md"),
+               ("M", "svc/a/src/other.py")]
+
+    def test_identical_renames_are_not_changes(self):
+        self.assertEqual(utils.filter_changed_paths(self.ENTRIES),
+                         ["svc/a/src/main.py", "svc/b/src/edited.py", "svc/c/src/gone.py", "docs/readme.md", "svc/a/src/other.py"])
+
+    def test_exclude_deleted(self):
+        self.assertNotIn("svc/c/src/gone.py", utils.filter_changed_paths(self.ENTRIES, excludeDeleted = True))
+
+    def test_starts_with_keeps_the_paths_under_the_directory(self):
+        entries = [("M", "svc/a.py"), ("M", "svcx/b.py"), ("M", "svc/c/d.py")]
+        self.assertEqual(utils.filter_changed_paths(entries, startsWith = "svc"), ["svc/a.py", "svc/c/d.py"])
+
+    def test_grouping_truncates_and_deduplicates_in_diff_order(self):
+        self.assertEqual(utils.filter_changed_paths(self.ENTRIES, groupPathsByEndingRegex = "svc/[^/]+"),
+                         ["svc/a", "svc/b", "svc/c"])
+
+    def test_grouping_drops_the_paths_that_do_not_match(self):
+        self.assertEqual(utils.filter_changed_paths(self.ENTRIES, excludeDeleted = True, startsWith = "svc", groupPathsByEndingRegex = "/src"),
+                         ["svc/a/src", "svc/b/src"])
+
+    def test_duplicate_paths_are_listed_once(self):
+        entries = [("M", "a.txt"), ("A", "b.txt"), ("M", "a.txt")]
+        self.assertEqual(utils.filter_changed_paths(entries), ["a.txt", "b.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+import os,sys,inspect,unittest
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+grandparentdir = os.path.dirname(parentdir)
+sys.path.insert(0,grandparentdir)
+
+import git_common_utils as utils
+
+# Offline tests of the ref parsing and of the RefSnapshot queries: python -m unittest discover -s tests/unit -p "test_*.py"
+
+
+def for_each_ref_line(refName, objectName, peeledObjectName = "", authorDate = "", creatorDate = ""):
+    return "\0".join([refName, objectName, peeledObjectName, authorDate, creatorDate])
+
+
+class ParseRefSnapshotOutputTest(unittest.TestCase):
+
+    def test_lightweight_and_annotated_tags(self):
+        output = "\n".join([for_each_ref_line("refs/tags/v1.0", "c1", "", "100", "100"),
+                            for_each_ref_line("refs/tags/v2.0", "t2", "c2", "", "200")]) + "\n"
+        refs = utils.parse_ref_snapshot_output(output)
+        self.assertEqual(refs, [{"refname": "refs/tags/v1.0", "objectname": "c1", "commit": "c1", "authordate": 100, "creatordate": 100},
+                                {"refname": "refs/tags/v2.0", "objectname": "t2", "commit": "c2", "authordate": 0, "creatordate": 200}])
+
+
+class ParseLsRemoteOutputTest(unittest.TestCase):
+
+    OUTPUT = ("c1\trefs/heads/master\n"
+              "c2\trefs/heads/feature/x\n"
+              "c3\trefs/tags/v1.0\n"
+              "t4\trefs/tags/v1.1\n"
+              "c4\trefs/tags/v1.1^{}\n")
+
+    def test_heads_become_origin_remote_branches(self):
+        refs = utils.parse_ls_remote_output(self.OUTPUT)
+        self.assertEqual([ref["refname"] for ref in refs],
+                         ["refs/remotes/origin/master", "refs/remotes/origin/feature/x", "refs/tags/v1.0", "refs/tags/v1.1"])
+
+    def test_annotated_tags_are_peeled(self):
+        snapshot = utils.RefSnapshot(utils.parse_ls_remote_output(self.OUTPUT))
+        self.assertEqual(snapshot.get_commit("refs/tags/v1.1"), "c4")
+        self.assertEqual(snapshot.get_commit("refs/tags/v1.0"), "c3")
+
+    def test_refs_have_no_dates(self):
+        for ref in utils.parse_ls_remote_output(self.OUTPUT):
+            self.assertIsNone(ref["authordate"])
+
+    def test_branches_and_tags(self):
+        snapshot = utils.RefSnapshot(utils.parse_ls_remote_output(self.OUTPUT))
+        self.assertEqual(snapshot.branches(), ["feature/x", "master"])
+        self.assertEqual(snapshot.tags(), ["v1.0", "v1.1"])
+
+
+class VersionSortKeyTest(unittest.TestCase):
+
+    def test_numbers_are_compared_numerically(self):
+        names = ["v1.10", "v1.2", "v1.9", "v2.0", "v1.2.1"]
+        self.assertEqual(sorted(names, key = utils.version_sort_key), ["v1.2", "v1.2.1", "v1.9", "v1.10", "v2.0"])
+
+
+class RefSnapshotTest(unittest.TestCase):
+
+    def make_snapshot(self):
+        return utils.RefSnapshot([
+            {"refname": "refs/remotes/origin/HEAD", "objectname": "c1", "commit": "c1", "authordate": 0, "creatordate": 0},
+            {"refname": "refs/remotes/origin/master", "objectname": "c1", "commit": "c1", "authordate": 0, "creatordate": 0},
+            {"refname": "refs/heads/master", "objectname": "c1", "commit": "c1", "authordate": 0, "creatordate": 0},
+            {"refname": "refs/tags/dta-rc-1", "objectname": "c1", "commit": "c1", "authordate": 100, "creatordate": 100},
+            {"refname": "refs/tags/dta-rc-2", "objectname": "c2", "commit": "c2", "authordate": 300, "creatordate": 300},
+            {"refname": "refs/tags/dta-rc-2b", "objectname": "c2", "commit": "c2", "authordate": 300, "creatordate": 300},
+            {"refname": "refs/tags/v1.10", "objectname": "c3", "commit": "c3", "authordate": 150, "creatordate": 150},
+            {"refname": "refs/tags/v1.2", "objectname": "c4", "commit": "c4", "authordate": 200, "creatordate": 200}])
+
+    def test_branches_skip_head(self):
+        self.assertEqual(self.make_snapshot().branches(), ["master"])
+        self.assertEqual(self.make_snapshot().local_branches(), ["master"])
+
+    def test_tag_filters_match_like_for_each_ref(self):
+        self.assertEqual(self.make_snapshot().tags("dta-rc-*"), ["dta-rc-1", "dta-rc-2", "dta-rc-2b"])
+        self.assertEqual(self.make_snapshot().tags("v1.2"), ["v1.2"])
+
+    def test_latest_tag_is_the_newest_by_authordate(self):
+        self.assertEqual(self.make_snapshot().latest_tag("v*"), "v1.2")
+        self.assertEqual(self.make_snapshot().latest_tag("none-*"), "")
+
+    def test_latest_tag_ties_are_sorted_by_name(self):
+        self.assertEqual(self.make_snapshot().latest_tag("dta-rc-*"), "dta-rc-2")
+
+    def test_latest_tag_without_dates_is_the_highest_version(self):
+        snapshot = utils.RefSnapshot(utils.parse_ls_remote_output("c3\trefs/tags/v1.10\nc4\trefs/tags/v1.2\nc5\trefs/tags/v1.9\n"))
+        self.assertEqual(snapshot.latest_tag(), "v1.10")
+
+    def test_reference_tag_skips_the_tags_on_the_latest_commit(self):
+        # Without a repository the ancestry is not checked, only tags on the same commit are skipped
+        self.assertEqual(self.make_snapshot().reference_tag("dta-rc-*"), "dta-rc-1")
+
+
+if __name__ == "__main__":
+    unittest.main()
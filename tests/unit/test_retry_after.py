@@ -0,0 +1,36 @@
+#!/usr/bin/python
+import os,sys,inspect,unittest,time
+import email.utils
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+grandparentdir = os.path.dirname(parentdir)
+sys.path.insert(0,grandparentdir)
+
+import git_common_utils as utils
+
+# Offline tests of the Retry-After parsing: python -m unittest discover -s tests/unit -p "test_*.py"
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(utils.parse_retry_after("120"), 120)
+        self.assertEqual(utils.parse_retry_after("1.5"), 1.5)
+
+    def test_negative_seconds_are_clamped(self):
+        self.assertEqual(utils.parse_retry_after("-5"), 0)
+
+    def test_http_date_in_the_future(self):
+        value = email.utils.formatdate(time.time() + 90, usegmt = True)
+        self.assertTrue(85 <= utils.parse_retry_after(value) <= 91)
+
+    def test_http_date_in_the_past(self):
+        self.assertEqual(utils.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+
+    def test_unparseable_values(self):
+        self.assertIsNone(utils.parse_retry_after("soon"))
+        self.assertIsNone(utils.parse_retry_after(""))
+
+
+if __name__ == "__main__":
+    unittest.main()
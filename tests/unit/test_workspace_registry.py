@@ -0,0 +1,93 @@
+#!/usr/bin/python
+import os,sys,inspect,unittest,shutil,tempfile
+from subprocess import check_call, PIPE
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+grandparentdir = os.path.dirname(parentdir)
+sys.path.insert(0,grandparentdir)
+
+import git_common_utils as utils
+
+# Tests of the workspace validation cache on a local repository, no Github access needed:
+# python -m unittest discover -s tests/unit -p "test_*.py"
+
+
+class StaticCredentialProvider(utils.CredentialProvider):
+
+    def get_credentials(self):
+        return "user", "token"
+
+
+class WorkspaceRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workingDir = tempfile.mkdtemp()
+        self.repositoryPath = os.path.join(self.workingDir, "my-repo")
+        self.environment = dict(os.environ)
+        # The identity is written to the global git config, keep it inside the temporary directory
+        os.environ["GIT_CONFIG_GLOBAL"] = os.path.join(self.workingDir, "gitconfig")
+        os.environ["GIT_AUTHOR_NAME"] = os.environ["GIT_COMMITTER_NAME"] = "test"
+        os.environ["GIT_AUTHOR_EMAIL"] = os.environ["GIT_COMMITTER_EMAIL"] = "test@example.com"
+
+        self.git("init", "-q", self.repositoryPath)
+        with open(os.path.join(self.repositoryPath, "README"), 'w') as f:
+            f.write("first\n")
+        self.git("add", "README")
+        self.git("commit", "-q", "-m", "first")
+        self.git("branch", "feature")
+        self.git("remote", "add", "origin", "https://github.com/my-org/my-repo.git")
+
+        self.credentialProvider = utils.CREDENTIAL_PROVIDER
+        self.distributionList = utils.DISTRIBUTION_LIST
+        self.checkOutput = utils.check_output
+        utils.set_credential_provider(StaticCredentialProvider())
+        utils.DISTRIBUTION_LIST = "test@example.com"
+        utils.WORKSPACE_REGISTRY = utils.WorkspaceRegistry()
+
+        # Records the shell commands run by the module
+        self.commands = []
+        def recording_check_output(command, *args, **kwargs):
+            self.commands.append(" ".join(command) if isinstance(command, list) else command)
+            return self.checkOutput(command, *args, **kwargs)
+        utils.check_output = recording_check_output
+
+    def tearDown(self):
+        utils.check_output = self.checkOutput
+        utils.set_credential_provider(self.credentialProvider)
+        utils.DISTRIBUTION_LIST = self.distributionList
+        utils.WORKSPACE_REGISTRY = utils.WorkspaceRegistry()
+        os.environ.clear()
+        os.environ.update(self.environment)
+        shutil.rmtree(self.workingDir, True)
+
+    def git(self, *arguments):
+        check_call(["git"] + list(arguments), cwd = self.workingDir if arguments[0] == "init" else self.repositoryPath, stdout = PIPE, stderr = PIPE)
+
+    def set_url_count(self):
+        return len([command for command in self.commands if "remote set-url" in command])
+
+    def test_origin_is_set_once(self):
+        utils.switch_to_workspace("my-repo", self.workingDir)
+        utils.switch_to_workspace("my-repo", self.workingDir)
+        self.assertEqual(self.set_url_count(), 1)
+
+    def test_checkout_and_commit_between_switches_do_not_set_the_origin_again(self):
+        utils.switch_to_workspace("my-repo", self.workingDir)
+        self.git("status")
+        self.git("checkout", "-q", "feature")
+        with open(os.path.join(self.repositoryPath, "README"), 'w') as f:
+            f.write("second\n")
+        self.git("commit", "-q", "-a", "-m", "second")
+        self.git("checkout", "-q", "-")
+        utils.switch_to_workspace("my-repo", self.workingDir)
+        self.assertEqual(self.set_url_count(), 1)
+
+    def test_origin_changed_by_another_tool_is_set_again(self):
+        utils.switch_to_workspace("my-repo", self.workingDir)
+        self.git("remote", "set-url", "origin", "https://github.com/my-org/other-repo.git")
+        utils.switch_to_workspace("my-repo", self.workingDir)
+        self.assertEqual(self.set_url_count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()